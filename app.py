@@ -1,10 +1,9 @@
 import streamlit as st
 import os
-from PIL import Image
 import io
-import matplotlib.pyplot as plt
-import pandas as pd
+import tempfile
 import time
+import uuid
 from datetime import datetime
 from dotenv import load_dotenv
 
@@ -13,9 +12,10 @@ load_dotenv()
 
 # Import custom modules with error handling
 try:
-    from image_processor import extract_fitness_data_from_image
-    from health_analyzer import analyze_health_metrics
-    from recommendations import generate_recommendations
+    from pipeline import run_pipeline
+    from image_processor import ocr_digit_signature, signatures_match, get_gemini_model, read_image_info, is_image_too_small
+    from cache import image_hasher, get_cached_results
+    from database import init_db, add_entry_to_db, get_history_rows, get_history_stats, decode_entry, SESSION_HISTORY_RETENTION_DAYS
 except ImportError as e:
     st.error(f"Error importing modules: {e}")
     st.stop()
@@ -28,6 +28,21 @@ st.set_page_config(
     initial_sidebar_state="expanded"
 )
 
+UPLOAD_CHUNK_SIZE = 1024 * 1024
+HISTORY_PAGE_SIZE = 10
+
+def spill_upload_to_disk(uploaded_file):
+    """Write an uploaded file to a temp file in chunks, returning its path and cache key"""
+    buffer = uploaded_file.getbuffer()
+    hasher = image_hasher()
+    suffix = os.path.splitext(uploaded_file.name)[1] or '.jpg'
+    with tempfile.NamedTemporaryFile(delete=False, suffix=suffix) as tmp:
+        for start in range(0, len(buffer), UPLOAD_CHUNK_SIZE):
+            chunk = buffer[start:start + UPLOAD_CHUNK_SIZE]
+            hasher.update(chunk)
+            tmp.write(chunk)
+    return tmp.name, hasher.hexdigest()
+
 # Get API key from Streamlit secrets or environment variables
 def get_api_key():
     try:
@@ -73,6 +88,13 @@ if not api_key:
 # Set the API key in environment for the modules
 os.environ["GEMINI_API_KEY"] = api_key
 
+# Configure Gemini and build the model handle once per server process, not per rerun
+@st.cache_resource
+def load_gemini_model():
+    return get_gemini_model()
+
+load_gemini_model()
+
 # App title and description
 st.title("🏃‍♂️ AI Fitness Health Analyzer")
 st.markdown("""
@@ -90,6 +112,13 @@ page = st.sidebar.radio("Choose a section:",
     index=0
 )
 
+# Create the history database once per server process
+@st.cache_resource
+def init_history_db():
+    init_db()
+
+init_history_db()
+
 # Initialize session state for storing data
 if 'fitness_data' not in st.session_state:
     st.session_state.fitness_data = None
@@ -97,8 +126,13 @@ if 'analysis_results' not in st.session_state:
     st.session_state.analysis_results = None
 if 'recommendations' not in st.session_state:
     st.session_state.recommendations = None
-if 'history' not in st.session_state:
-    st.session_state.history = []
+if 'analysis_date' not in st.session_state:
+    st.session_state.analysis_date = None
+if 'last_ocr_signature' not in st.session_state:
+    st.session_state.last_ocr_signature = None
+if 'session_id' not in st.session_state:
+    # History rows are scoped to the browser session that created them
+    st.session_state.session_id = uuid.uuid4().hex
 
 # Upload Image Page
 if page == "📸 Upload Image":
@@ -125,27 +159,30 @@ if page == "📸 Upload Image":
     )
     
     if uploaded_file is not None:
+        temp_path = None
         try:
-            # Display the uploaded image
-            image = Image.open(uploaded_file)
+            # Work from a file on disk so no decoded copy of the image is kept in memory
+            temp_path, cache_key = spill_upload_to_disk(uploaded_file)
+            image_size, image_format = read_image_info(temp_path)
             
+            # Display the uploaded image
             col1, col2 = st.columns([2, 1])
             with col1:
-                st.image(image, caption="📱 Your uploaded image", use_column_width=True)
+                st.image(temp_path, caption="📱 Your uploaded image", use_container_width=True)
             
             with col2:
                 st.info(f"""
                 **Image Info:**
-                - Size: {image.size[0]} x {image.size[1]} pixels
-                - Format: {image.format}
-                - File size: {len(uploaded_file.getvalue()) / 1024:.1f} KB
+                - Size: {image_size[0]} x {image_size[1]} pixels
+                - Format: {image_format}
+                - File size: {uploaded_file.size / 1024:.1f} KB
                 """)
             
             # Process button
             if st.button("🚀 Analyze Image", type="primary", use_container_width=True):
                 with st.spinner("🤖 Processing image with AI... This may take a moment..."):
                     # Check image dimensions and size
-                    if max(image.size) < 200:
+                    if is_image_too_small(image_size):
                         st.error("📏 Image is too small. Please upload a larger image with clear text.")
                         st.stop()
                     
@@ -154,45 +191,67 @@ if page == "📸 Upload Image":
                     status_text = st.empty()
                     
                     try:
-                        # Step 1: Extract data
-                        status_text.text("🔍 Extracting fitness data from image...")
-                        progress_bar.progress(25)
+                        pipeline_steps = {
+                            "extract": ("🔍 Extracting fitness data from image...", 25),
+                            "analyze": ("📊 Analyzing your health metrics...", 50),
+                            "recommend": ("💡 Generating personalized recommendations...", 75),
+                        }
                         
-                        fitness_data = extract_fitness_data_from_image(image)
+                        def show_step(step):
+                            message, percent = pipeline_steps[step]
+                            status_text.text(message)
+                            progress_bar.progress(percent)
+                        
+                        # An exact re-upload reuses its earlier results without running OCR
+                        cached = get_cached_results(cache_key)
+                        if cached:
+                            fitness_data, analysis_results, recommendations = cached
+                            # The analyzed screenshot's signature is unknown, so don't compare against a stale one
+                            st.session_state.last_ocr_signature = None
+                        else:
+                            # Near-identical re-uploads of the last analyzed screenshot reuse its
+                            # results without calling Gemini again
+                            ocr_signature = ocr_digit_signature(temp_path)
+                            if st.session_state.fitness_data and signatures_match(ocr_signature, st.session_state.last_ocr_signature):
+                                fitness_data = st.session_state.fitness_data
+                                analysis_results = st.session_state.analysis_results
+                                recommendations = st.session_state.recommendations
+                            else:
+                                # Steps 1-3: Extract data, analyze it and generate recommendations
+                                fitness_data, analysis_results, recommendations = run_pipeline(
+                                    temp_path,
+                                    cache_key=cache_key,
+                                    on_step=show_step
+                                )
+                                # Only a screenshot that was actually analyzed becomes the reference,
+                                # so reused results can't drift forward across a chain of similar uploads
+                                if fitness_data:
+                                    st.session_state.last_ocr_signature = ocr_signature
                         
                         if not fitness_data:
                             st.error("❌ Could not extract fitness data from the image. Please try another image with clearer fitness metrics.")
                             st.info("💡 **Tips:** Use images that clearly show numbers for steps, calories, or other fitness metrics. Make sure the text is readable and not blurry.")
                             st.stop()
                         
-                        # Step 2: Analyze data
-                        status_text.text("📊 Analyzing your health metrics...")
-                        progress_bar.progress(50)
-                        
-                        analysis_results = analyze_health_metrics(fitness_data)
-                        
-                        # Step 3: Generate recommendations
-                        status_text.text("💡 Generating personalized recommendations...")
-                        progress_bar.progress(75)
-                        
-                        recommendations = generate_recommendations(analysis_results)
-                        
                         # Step 4: Save results
                         status_text.text("💾 Saving your results...")
                         progress_bar.progress(100)
                         
+                        analysis_date = datetime.now().strftime("%Y-%m-%d %H:%M")
+                        
                         # Store in session state
                         st.session_state.fitness_data = fitness_data
                         st.session_state.analysis_results = analysis_results
                         st.session_state.recommendations = recommendations
+                        st.session_state.analysis_date = analysis_date
                         
                         # Add to history
-                        st.session_state.history.append({
-                            "date": datetime.now().strftime("%Y-%m-%d %H:%M"),
+                        add_entry_to_db({
+                            "date": analysis_date,
                             "fitness_data": fitness_data,
                             "analysis_results": analysis_results,
                             "recommendations": recommendations
-                        })
+                        }, session_id=st.session_state.session_id)
                         
                         # Clear progress
                         progress_bar.empty()
@@ -233,6 +292,13 @@ if page == "📸 Upload Image":
         except Exception as e:
             st.error(f"❌ Error processing image: {str(e)}")
             st.info("Please try a different image format or check if the file is corrupted.")
+        finally:
+            # Clean up temporary file
+            if temp_path:
+                try:
+                    os.remove(temp_path)
+                except OSError:
+                    pass
 
 # Dashboard Page
 elif page == "📊 Dashboard":
@@ -240,29 +306,28 @@ elif page == "📊 Dashboard":
     
     if st.session_state.fitness_data and st.session_state.analysis_results and st.session_state.recommendations:
         # Display date of analysis
-        if st.session_state.history:
-            latest_date = st.session_state.history[-1]["date"]
-            st.caption(f"📅 Latest analysis: {latest_date}")
+        if st.session_state.analysis_date:
+            st.caption(f"📅 Latest analysis: {st.session_state.analysis_date}")
         
         # Key metrics in columns
         st.subheader("📈 Key Metrics")
         metrics = st.session_state.fitness_data
         
-        # Create columns for metrics
-        metric_cols = st.columns(len(metrics))
+        # Add appropriate emoji for each metric
+        emoji_map = {
+            'steps': '👣',
+            'calories': '🔥',
+            'total_calories': '🔥',
+            'distance': '📏',
+            'active_minutes': '⏱️',
+            'stairs': '🪜'
+        }
+        
+        # Lay the metrics out in a fixed grid of four columns
+        metric_cols = st.columns(4)
         for i, (metric, value) in enumerate(metrics.items()):
-            with metric_cols[i % len(metric_cols)]:
-                # Add appropriate emoji for each metric
-                emoji_map = {
-                    'steps': '👣',
-                    'calories': '🔥',
-                    'total_calories': '🔥',
-                    'distance': '📏',
-                    'active_minutes': '⏱️',
-                    'stairs': '🪜'
-                }
-                emoji = emoji_map.get(metric, '📊')
-                st.metric(f"{emoji} {metric.replace('_', ' ').title()}", value)
+            emoji = emoji_map.get(metric, '📊')
+            metric_cols[i % len(metric_cols)].metric(f"{emoji} {metric.replace('_', ' ').title()}", value)
         
         # Create two columns for analysis and visualization
         col1, col2 = st.columns([1, 1])
@@ -292,21 +357,11 @@ elif page == "📊 Dashboard":
             metrics_to_plot = {k: v for k, v in metrics.items() if isinstance(v, (int, float))}
             
             if metrics_to_plot:
-                fig, ax = plt.subplots(figsize=(10, 6))
-                bars = ax.bar(metrics_to_plot.keys(), metrics_to_plot.values())
-                ax.set_title("Your Fitness Metrics")
-                ax.set_ylabel("Value")
-                ax.set_xlabel("Metric")
+                # Imported here so other pages don't pay for loading pandas
+                import pandas as pd
                 
-                # Add value labels on bars
-                for bar in bars:
-                    height = bar.get_height()
-                    ax.text(bar.get_x() + bar.get_width()/2., height,
-                           f'{height}', ha='center', va='bottom')
-                
-                plt.xticks(rotation=45, ha='right')
-                plt.tight_layout()
-                st.pyplot(fig)
+                st.caption("Your Fitness Metrics")
+                st.bar_chart(pd.Series(metrics_to_plot, name="Value"))
             else:
                 st.info("No numeric data available for visualization")
         
@@ -334,11 +389,24 @@ elif page == "📊 Dashboard":
 elif page == "📈 History":
     st.header("📈 Your Analysis History")
     
-    if st.session_state.history:
-        st.write(f"📊 Total analyses: **{len(st.session_state.history)}**")
+    stats = get_history_stats(st.session_state.session_id)
+    
+    if stats["count"]:
+        st.write(f"📊 Total analyses: **{stats['count']}**")
         
-        for i, entry in enumerate(reversed(st.session_state.history)):
-            with st.expander(f"📅 Analysis from {entry['date']}", expanded=(i==0)):
+        # Only fetch and render one page of entries per rerun
+        page_count = (stats["count"] + HISTORY_PAGE_SIZE - 1) // HISTORY_PAGE_SIZE
+        history_page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1)
+        st.caption(f"Page {history_page} of {page_count}")
+        
+        rows = get_history_rows(
+            st.session_state.session_id,
+            limit=HISTORY_PAGE_SIZE,
+            offset=(history_page - 1) * HISTORY_PAGE_SIZE
+        )
+        for i, row in enumerate(rows):
+            with st.expander(f"📅 Analysis from {row[1]}", expanded=(history_page == 1 and i == 0)):
+                entry = decode_entry(row)
                 col1, col2 = st.columns(2)
                 
                 with col1:
@@ -366,7 +434,7 @@ elif page == "📈 History":
 elif page == "ℹ️ About":
     st.header("ℹ️ About AI Fitness Health Analyzer")
     
-    st.markdown("""
+    st.markdown(f"""
     ## 🚀 How It Works
     
     The AI Fitness Health Analyzer uses **Google's Gemini 1.5-flash AI model** to:
@@ -377,7 +445,7 @@ elif page == "ℹ️ About":
     
     ## 🔒 Privacy Notice
     
-    Your uploaded images are processed securely and **not stored permanently**. We value your privacy and data security.
+    Your uploaded images are processed securely and **not stored permanently**. The extracted metrics in your analysis history are deleted automatically after {SESSION_HISTORY_RETENTION_DAYS} days. We value your privacy and data security.
     
     ## 🛠️ Technical Stack
     
@@ -400,21 +468,20 @@ elif page == "ℹ️ About":
     """)
     
     # Add some stats if available
-    if st.session_state.history:
+    stats = get_history_stats(st.session_state.session_id)
+    if stats["count"]:
         st.subheader("📊 Your Stats")
         col1, col2, col3 = st.columns(3)
         
         with col1:
-            st.metric("📸 Images Analyzed", len(st.session_state.history))
+            st.metric("📸 Images Analyzed", stats["count"])
         
         with col2:
-            # Calculate average steps if available
-            steps_data = [entry["fitness_data"].get("steps", 0) for entry in st.session_state.history if entry["fitness_data"].get("steps")]
-            avg_steps = sum(steps_data) / len(steps_data) if steps_data else 0
-            st.metric("👣 Avg Daily Steps", f"{avg_steps:,.0f}")
+            # Average steps over the analyses that recorded them
+            st.metric("👣 Avg Daily Steps", f"{stats['avg_steps']:,.0f}")
         
         with col3:
-            st.metric("📅 Days Tracked", len(st.session_state.history))
+            st.metric("📅 Days Tracked", stats["count"])
 
 # Footer
 st.markdown("---")
@@ -0,0 +1,46 @@
+"""
+Shared in-process caches for the AI Fitness Health Analyzer.
+Repeated uploads of the same image reuse the previous Gemini results
+instead of paying for another API round-trip.
+"""
+
+import hashlib
+import logging
+import threading
+from cachetools import TTLCache
+
+logger = logging.getLogger(__name__)
+
+# Maps image hash -> (fitness_data, analysis_results, recommendations)
+gemini_cache = TTLCache(maxsize=512, ttl=600)
+
+# TTLCache is not thread-safe and Flask serves requests from several threads
+_cache_lock = threading.Lock()
+
+def image_hasher():
+    """Create a hasher for building an image cache key incrementally"""
+    return hashlib.blake2b(digest_size=16)
+
+def get_cached_results(key):
+    """
+    Look up previously computed results for an image.
+
+    Args:
+        key (str): Hex digest of the image contents from image_hasher
+
+    Returns:
+        tuple: (fitness_data, analysis_results, recommendations) or None on a miss
+    """
+    with _cache_lock:
+        results = gemini_cache.get(key)
+
+    if results is None:
+        logger.info(f"Gemini cache miss for image {key}")
+    else:
+        logger.info(f"Gemini cache hit for image {key}")
+    return results
+
+def cache_results(key, fitness_data, analysis_results, recommendations):
+    """Store the results of a successful analysis for an image"""
+    with _cache_lock:
+        gemini_cache[key] = (fitness_data, analysis_results, recommendations)
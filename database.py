@@ -0,0 +1,232 @@
+"""
+SQLite storage for the analysis history.
+Shared by the Flask API (run.py) and the Streamlit app (app.py).
+"""
+
+import os
+import orjson
+import logging
+import sqlite3
+import threading
+from datetime import datetime, timedelta
+
+logger = logging.getLogger(__name__)
+
+DB_PATH = 'fitness_analyzer.db'
+
+# Streamlit sessions can't be resumed once the browser session ends, so their
+# history is only kept this long
+SESSION_HISTORY_RETENTION_DAYS = int(os.environ.get('SESSION_HISTORY_RETENTION_DAYS', 7))
+
+# One connection per thread. Flask's gthread workers keep their threads, so the
+# connection is reused across requests; Streamlit runs each rerun on a new thread,
+# so app.py gets a fresh connection per rerun.
+_local = threading.local()
+
+def get_conn():
+    """
+    Get this thread's database connection, opening and tuning it on first use.
+
+    The connection runs in autocommit mode; writes group their statements
+    in an explicit transaction. Reuse only pays off on long-lived threads such
+    as the Flask workers; Streamlit reruns each open their own connection.
+
+    Returns:
+        sqlite3.Connection: The connection for the calling thread
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = sqlite3.connect(DB_PATH, isolation_level=None)
+        # WAL lets readers run alongside a writer, and NORMAL sync skips the fsync on every commit
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.execute('PRAGMA temp_store=MEMORY')
+        conn.execute('PRAGMA mmap_size=134217728')
+        _local.conn = conn
+    return conn
+
+# Initialize database
+def init_db():
+    conn = get_conn()
+    cursor = conn.cursor()
+    cursor.execute('''
+    CREATE TABLE IF NOT EXISTS history (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        date TEXT NOT NULL,
+        fitness_data TEXT NOT NULL,
+        analysis_results TEXT NOT NULL,
+        recommendations TEXT NOT NULL,
+        session_id TEXT
+    )
+    ''')
+
+    # Databases created before Streamlit history was stored here lack the session column
+    columns = [row[1] for row in cursor.execute('PRAGMA table_info(history)')]
+    if 'session_id' not in columns:
+        cursor.execute('ALTER TABLE history ADD COLUMN session_id TEXT')
+
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_date ON history(date)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_history_session ON history(session_id, id)')
+    prune_session_history(cursor)
+    logger.info("Database initialized")
+
+# Delete expired Streamlit session history
+def prune_session_history(cursor):
+    """
+    Delete Streamlit session rows older than the retention period.
+
+    API history (no session) is left alone. Streamlit dates are stored as
+    "%Y-%m-%d %H:%M" local time, so they compare correctly as strings.
+
+    Args:
+        cursor (sqlite3.Cursor): Cursor to run the delete on
+
+    Returns:
+        int: Number of rows deleted
+    """
+    cutoff = (datetime.now() - timedelta(days=SESSION_HISTORY_RETENTION_DAYS)).strftime("%Y-%m-%d %H:%M")
+    cursor.execute('DELETE FROM history WHERE session_id IS NOT NULL AND date < ?', (cutoff,))
+    if cursor.rowcount:
+        logger.info(f"Deleted {cursor.rowcount} expired session history entries")
+    return cursor.rowcount
+
+def decode_entry(row):
+    """
+    Turn a history row into an entry dictionary.
+
+    Args:
+        row (tuple): (id, date, fitness_data, analysis_results, recommendations)
+
+    Returns:
+        dict: The decoded history entry
+    """
+    return {
+        "id": row[0],
+        "date": row[1],
+        "fitness_data": orjson.loads(row[2]),
+        "analysis_results": orjson.loads(row[3]),
+        "recommendations": orjson.loads(row[4])
+    }
+
+# Get raw history rows, newest first
+def get_history_rows(session_id=None, limit=None, offset=0):
+    """
+    Fetch history rows without decoding their JSON columns.
+
+    Args:
+        session_id (str): Streamlit session to read, or None for the API history
+        limit (int): Maximum number of rows to return, or None for all
+        offset (int): Number of newer rows to skip, for paging
+
+    Returns:
+        list: Rows suitable for decode_entry
+    """
+    try:
+        conn = get_conn()
+        cursor = conn.cursor()
+        query = 'SELECT id, date, fitness_data, analysis_results, recommendations FROM history WHERE session_id IS ? ORDER BY id DESC'
+        params = (session_id,)
+        if limit is not None:
+            query += ' LIMIT ? OFFSET ?'
+            params += (limit, offset)
+        cursor.execute(query, params)
+        rows = cursor.fetchall()
+        return rows
+    except Exception as e:
+        logger.error(f"Error retrieving history: {str(e)}")
+        return []
+
+# Get history from database
+def get_history_from_db(session_id=None, limit=None):
+    return [decode_entry(row) for row in get_history_rows(session_id, limit)]
+
+# Get summary statistics for a history
+def get_history_stats(session_id=None):
+    """
+    Count the analyses in a history and average their step counts.
+
+    Args:
+        session_id (str): Streamlit session to read, or None for the API history
+
+    Returns:
+        dict: {"count": int, "avg_steps": float}
+    """
+    try:
+        conn = get_conn()
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT COUNT(*), AVG(NULLIF(json_extract(fitness_data, '$.steps'), 0)) FROM history WHERE session_id IS ?",
+            (session_id,)
+        )
+        count, avg_steps = cursor.fetchone()
+        return {"count": count, "avg_steps": avg_steps or 0}
+    except Exception as e:
+        logger.error(f"Error retrieving history stats: {str(e)}")
+        return {"count": 0, "avg_steps": 0}
+
+# Add entries to database
+def add_entries_to_db(entries, session_id=None):
+    """
+    Insert several history entries in a single transaction.
+
+    Args:
+        entries (list): Entry dictionaries with date, fitness_data,
+            analysis_results and recommendations
+        session_id (str): Streamlit session the entries belong to, or None for the API
+
+    Returns:
+        list: The new entry ids, or None if the insert failed
+    """
+    try:
+        conn = get_conn()
+        cursor = conn.cursor()
+        entry_ids = []
+        cursor.execute('BEGIN IMMEDIATE')
+        try:
+            for entry in entries:
+                cursor.execute(
+                    'INSERT INTO history (date, fitness_data, analysis_results, recommendations, session_id) VALUES (?, ?, ?, ?, ?)',
+                    (
+                        entry["date"],
+                        # Stored as TEXT rather than raw bytes so json_extract() keeps working
+                        orjson.dumps(entry["fitness_data"]).decode(),
+                        orjson.dumps(entry["analysis_results"]).decode(),
+                        orjson.dumps(entry["recommendations"]).decode(),
+                        session_id
+                    )
+                )
+                entry_ids.append(cursor.lastrowid)
+            # Long-running Streamlit servers only call init_db once, so also prune on insert
+            if session_id is not None:
+                prune_session_history(cursor)
+            cursor.execute('COMMIT')
+        except Exception:
+            cursor.execute('ROLLBACK')
+            raise
+        return entry_ids
+    except Exception as e:
+        logger.error(f"Error adding entries to database: {str(e)}")
+        return None
+
+# Add entry to database
+def add_entry_to_db(entry, session_id=None):
+    entry_ids = add_entries_to_db([entry], session_id)
+    return entry_ids[0] if entry_ids else None
+
+# Get entry from database
+def get_entry_from_db(entry_id, session_id=None):
+    try:
+        conn = get_conn()
+        cursor = conn.cursor()
+        cursor.execute(
+            'SELECT id, date, fitness_data, analysis_results, recommendations FROM history WHERE id = ? AND session_id IS ?',
+            (entry_id, session_id)
+        )
+        row = cursor.fetchone()
+
+        if row:
+            return decode_entry(row)
+        return None
+    except Exception as e:
+        logger.error(f"Error retrieving entry from database: {str(e)}")
+        return None
@@ -2,7 +2,6 @@
 Gunicorn configuration file for production deployment.
 """
 
-import multiprocessing
 import os
 
 # Server socket
@@ -10,8 +9,14 @@ bind = f"0.0.0.0:{os.environ.get('PORT', 5000)}"
 backlog = 2048
 
 # Worker processes
-workers = multiprocessing.cpu_count() * 2 + 1
-worker_class = "sync"
+# cpu_count() reports the host's cores inside containers, so take the worker count from
+# WEB_CONCURRENCY like the platform default instead. Gemini concurrency is capped per
+# process (GEMINI_MAX_CONCURRENCY), so the total cap is workers * that value.
+workers = int(os.environ.get('WEB_CONCURRENCY', 2))
+# Requests mostly wait on the Gemini API, so serve them from threads
+# instead of tying up a whole process per request
+worker_class = "gthread"
+threads = int(os.environ.get('GUNICORN_THREADS', 8))
 worker_connections = 1000
 timeout = 30
 keepalive = 2
@@ -1,19 +1,86 @@
 import os
 import io
 import base64
+import copy
 from PIL import Image
 import google.generativeai as genai
+from google.api_core import exceptions as google_exceptions
+from tenacity import retry, retry_if_exception_type, stop_after_attempt, wait_exponential
 import re
-import json
+import orjson
 import logging
+import queue
+import threading
+import time
 import traceback
+import difflib
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import cache
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
-# Configure the Gemini API
-genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+# Cap concurrent Gemini requests per process so request threads don't flood the API quota.
+# Each gunicorn worker has its own semaphore, so the server-wide cap is workers * this value.
+GEMINI_MAX_CONCURRENCY = int(os.environ.get("GEMINI_MAX_CONCURRENCY", 5))
+_gemini_semaphore = threading.BoundedSemaphore(GEMINI_MAX_CONCURRENCY)
+
+# Transient Gemini failures (rate limits, overload, timeouts) are retried with backoff
+RETRYABLE_GEMINI_ERRORS = (
+    google_exceptions.ResourceExhausted,
+    google_exceptions.ServiceUnavailable,
+    google_exceptions.DeadlineExceeded,
+    TimeoutError,
+)
+GEMINI_MAX_ATTEMPTS = 3
+GEMINI_MAX_BACKOFF = 30
+_exponential_backoff = wait_exponential(multiplier=1, min=1, max=GEMINI_MAX_BACKOFF)
+
+# Images uploaded close together are sent to Gemini in one request
+GEMINI_BATCH_WINDOW = int(os.environ.get("GEMINI_BATCH_WINDOW_MS", 50)) / 1000
+GEMINI_MAX_BATCH_SIZE = int(os.environ.get("GEMINI_MAX_BATCH_SIZE", 8))
+
+FITNESS_PROMPT = """
+        Extract fitness data from this image. Look for numerical values of metrics such as:
+        - Steps
+        - Calories burned
+        - Distance (miles/km)
+        - Active minutes
+        - Heart rate
+        - Sleep duration
+        - Exercise duration
+        
+        Format the response as a JSON object with the metrics as keys and values as numbers.
+        Only include metrics that are clearly visible in the image.
+        Example: {"steps": 8500, "calories": 2100, "distance": 5.2}
+        
+        If you cannot extract any fitness metrics from the image, respond with {"error": "No fitness data found in image"}
+        """
+
+BATCH_PROMPT_SUFFIX = """
+        You are given {count} images, labelled Image 1 to Image {count} in the order they appear.
+        Apply the instructions above to each image separately.
+        Respond with a single JSON object whose keys are the image numbers as strings and whose
+        values are the JSON objects you would have returned for each image.
+        Example: {{"1": {{"steps": 8500, "calories": 2100}}, "2": {{"error": "No fitness data found in image"}}}}
+        """
+
+# Gemini often wraps its JSON answer in a markdown code block
+_JSON_BLOCK_RE = re.compile(r'```json\s*(.*?)\s*```', re.DOTALL)
+_JSON_OBJECT_RE = re.compile(r'({.*})', re.DOTALL)
+
+# A re-upload whose OCR'd digits are this similar to the previous screenshot reuses its results
+OCR_REUSE_THRESHOLD = 0.95
+OCR_MIN_SIGNATURE_LENGTH = 4
+_NON_DIGIT_RE = re.compile(r'\D')
+
+# Images smaller than this on their long edge are too small to read reliably
+MIN_IMAGE_EDGE = 200
+
+# Gemini gains nothing from larger images, and token cost scales with pixels
+MAX_IMAGE_EDGE = 1024
+JPEG_QUALITY = 85
 
 # Try to import OpenCV and pytesseract for OCR fallback
 try:
@@ -37,30 +104,35 @@ class ImageProcessor:
         """Initialize the image processor"""
         self.ocr_available = OCR_AVAILABLE
     
+    def read_text(self, image):
+        """Run OCR on an image, raising on failure"""
+        # Convert PIL Image to OpenCV format
+        if isinstance(image, str):
+            # If image is a file path
+            cv_image = cv2.imread(image)
+        elif _is_file(image):
+            # If image is a file object
+            cv_image = cv2.imdecode(np.frombuffer(_read_file_bytes(image), np.uint8), cv2.IMREAD_COLOR)
+        else:
+            # If image is a PIL Image
+            cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
+        
+        # Preprocess image for better OCR
+        gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
+        
+        # Apply thresholding to get better text extraction
+        _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+        
+        # Use pytesseract to extract text
+        return pytesseract.image_to_string(thresh, config='--psm 6')
+    
     def extract_text(self, image):
         """Extract text from image using OCR"""
         if not self.ocr_available:
             return "OCR not available. Please install opencv-python and pytesseract."
         
         try:
-            # Convert PIL Image to OpenCV format
-            if isinstance(image, str):
-                # If image is a file path
-                cv_image = cv2.imread(image)
-            else:
-                # If image is a PIL Image
-                cv_image = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-            
-            # Preprocess image for better OCR
-            gray = cv2.cvtColor(cv_image, cv2.COLOR_BGR2GRAY)
-            
-            # Apply thresholding to get better text extraction
-            _, thresh = cv2.threshold(gray, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
-            
-            # Use pytesseract to extract text
-            text = pytesseract.image_to_string(thresh, config='--psm 6')
-            
-            return text
+            return self.read_text(image)
             
         except Exception as e:
             logger.error(f"OCR Error: {e}")
@@ -164,7 +236,7 @@ class ImageProcessor:
         Extract fitness data from image using OCR as a fallback method
         
         Args:
-            image (PIL.Image or str): Image object or path
+            image (PIL.Image, str or file object): Image object, path or open file
             
         Returns:
             dict: Extracted fitness data
@@ -194,85 +266,376 @@ class ImageProcessor:
             return None
 
 
-def extract_fitness_data_from_image(image):
+def _retry_after_or_backoff(retry_state):
+    """Wait for the server's Retry-After if it sent one, otherwise back off exponentially"""
+    error = retry_state.outcome.exception()
+    response = getattr(error, 'response', None)
+    retry_after = getattr(response, 'headers', {}).get('Retry-After') if response is not None else None
+    if retry_after:
+        try:
+            return min(float(retry_after), GEMINI_MAX_BACKOFF)
+        except ValueError:
+            pass
+    return _exponential_backoff(retry_state)
+
+def _log_gemini_retry(retry_state):
+    """Log each retried Gemini call"""
+    logger.warning(
+        f"Gemini request failed, retrying: attempt={retry_state.attempt_number} "
+        f"wait={retry_state.next_action.sleep:.1f}s error={retry_state.outcome.exception()!r}"
+    )
+
+@retry(
+    retry=retry_if_exception_type(RETRYABLE_GEMINI_ERRORS),
+    wait=_retry_after_or_backoff,
+    stop=stop_after_attempt(GEMINI_MAX_ATTEMPTS),
+    before_sleep=_log_gemini_retry,
+    reraise=True,
+)
+def _generate_content(model, contents):
+    """Send a request to Gemini, holding a concurrency slot only while it is in flight"""
+    with _gemini_semaphore:
+        return model.generate_content(contents, timeout=30)
+
+def _is_file(image):
+    """Check whether an image argument is an open file object, such as an upload stream"""
+    return hasattr(image, 'read')
+
+def _read_file_bytes(image):
+    """Read the raw bytes of an image given as a path or file object"""
+    if _is_file(image):
+        image.seek(0)
+        return image.read()
+    with open(image, 'rb') as f:
+        return f.read()
+
+def read_image_info(image):
     """
-    Extract fitness data from an image using Google's Gemini AI with OCR fallback.
+    Read an image's dimensions and format from its header, without decoding any pixels.
     
     Args:
-        image (PIL.Image): The image containing fitness data
+        image (str or file object): Path to the image or an open file
     
     Returns:
-        dict: A dictionary of extracted fitness metrics
+        tuple: ((width, height), format)
+    """
+    if _is_file(image):
+        image.seek(0)
+    with Image.open(image) as img:
+        return img.size, img.format
+
+def is_image_too_small(size):
+    """Check image dimensions against the minimum readable size"""
+    return max(size) < MIN_IMAGE_EDGE
+
+def _ocr_preview(image):
+    """
+    Load an image at no more than MAX_IMAGE_EDGE for the OCR signature.
+    
+    Full-resolution phone screenshots take seconds to OCR; the downscaled copy
+    keeps the check far cheaper than the Gemini call it tries to skip.
+    
+    Args:
+        image (PIL.Image, str or file object): The image, a path to it or an open file
+    
+    Returns:
+        PIL.Image: An RGB copy of the image fitting MAX_IMAGE_EDGE
+    """
+    if isinstance(image, str) or _is_file(image):
+        if _is_file(image):
+            image.seek(0)
+        with Image.open(image) as img:
+            # Let the JPEG decoder skip detail we are about to throw away
+            img.draft('RGB', (MAX_IMAGE_EDGE, MAX_IMAGE_EDGE))
+            preview = img.convert('RGB')
+    else:
+        preview = image.convert('RGB')
+    
+    preview.thumbnail((MAX_IMAGE_EDGE, MAX_IMAGE_EDGE), Image.LANCZOS)
+    return preview
+
+def ocr_digit_signature(image):
+    """
+    Read the digits visible in an image with local OCR, as a cheap fingerprint of its metrics.
+    
+    Args:
+        image (PIL.Image, str or file object): The image, a path to it or an open file
+    
+    Returns:
+        str: The digits in reading order, or None if OCR is unavailable or fails
+    """
+    if not OCR_AVAILABLE:
+        return None
+    
+    try:
+        text = ImageProcessor().read_text(_ocr_preview(image))
+    except Exception as e:
+        logger.warning(f"OCR signature unavailable: {e}")
+        return None
+    
+    return _NON_DIGIT_RE.sub('', text)
+
+def signatures_match(signature, previous_signature):
+    """
+    Check whether two OCR digit signatures are close enough to treat the images as the same.
+    
+    Args:
+        signature (str): Signature of the new image
+        previous_signature (str): Signature of the previously analyzed image
+    
+    Returns:
+        bool: True if the previous results can be reused
+    """
+    if not signature or not previous_signature:
+        return False
+    if min(len(signature), len(previous_signature)) < OCR_MIN_SIGNATURE_LENGTH:
+        return False
+    
+    similarity = difflib.SequenceMatcher(None, signature, previous_signature).ratio()
+    logger.info(f"OCR signature similarity to previous image: {similarity:.3f}")
+    return similarity >= OCR_REUSE_THRESHOLD
+
+def _encode_downscaled(image):
+    """Shrink an image to fit MAX_IMAGE_EDGE and encode it as JPEG"""
+    image.thumbnail((MAX_IMAGE_EDGE, MAX_IMAGE_EDGE), Image.LANCZOS)
+    if image.mode not in ('RGB', 'L'):
+        image = image.convert('RGB')
+    
+    img_byte_arr = io.BytesIO()
+    image.save(img_byte_arr, format='JPEG', quality=JPEG_QUALITY)
+    return img_byte_arr.getvalue()
+
+def prepare_image_bytes(image):
+    """
+    Encode an image for the Gemini API, downscaling it if it is larger than needed.
+    
+    Args:
+        image (PIL.Image, str or file object): The image, a path to it or an open file
+    
+    Returns:
+        bytes: Encoded image data
+    """
+    if isinstance(image, str) or _is_file(image):
+        if _is_file(image):
+            image.seek(0)
+        with Image.open(image) as img:
+            if max(img.size) > MAX_IMAGE_EDGE:
+                # Let the JPEG decoder skip detail we are about to throw away
+                img.draft('RGB', (MAX_IMAGE_EDGE, MAX_IMAGE_EDGE))
+                img_byte_arr = _encode_downscaled(img)
+                logger.info(f"Image downscaled from file, size: {len(img_byte_arr)} bytes")
+                return img_byte_arr
+        
+        # Small enough already, send the file as uploaded
+        img_byte_arr = _read_file_bytes(image)
+        logger.info(f"Image read from file, size: {len(img_byte_arr)} bytes")
+        return img_byte_arr
+    
+    if max(image.size) > MAX_IMAGE_EDGE:
+        # Work on a copy so the caller's image is left untouched
+        img_byte_arr = _encode_downscaled(image.copy())
+        logger.info(f"Image downscaled to bytes, size: {len(img_byte_arr)} bytes")
+        return img_byte_arr
+    
+    # Ensure image has a format, default to JPEG if not specified
+    img_format = image.format if image.format else 'JPEG'
+    
+    # Save with appropriate format and quality
+    img_byte_arr = io.BytesIO()
+    image.save(img_byte_arr, format=img_format, quality=95)
+    img_byte_arr = img_byte_arr.getvalue()
+    
+    logger.info(f"Image converted to bytes, size: {len(img_byte_arr)} bytes, format: {img_format}")
+    return img_byte_arr
+
+def _find_json_string(response_text):
+    """Pull the JSON part out of a Gemini response"""
+    # Find JSON in the response (it might be embedded in markdown code blocks)
+    json_match = _JSON_BLOCK_RE.search(response_text)
+    if json_match:
+        logger.info("Found JSON in code block")
+        return json_match.group(1)
+    
+    # Try to find a regular JSON object
+    json_match = _JSON_OBJECT_RE.search(response_text)
+    if json_match:
+        logger.info("Found JSON in plain text")
+        return json_match.group(1)
+    
+    logger.warning("Could not find JSON in response, using full response")
+    return response_text
+
+@cache
+def get_gemini_model():
+    """
+    Configure the Gemini API and build the model handle on first use, then reuse it.
+    
+    Configuring lazily means the key is read after the entrypoint has loaded it
+    (the Streamlit app only copies it from st.secrets after importing this module).
+    
+    Returns:
+        genai.GenerativeModel: The shared Gemini model
     """
+    genai.configure(api_key=os.environ.get("GEMINI_API_KEY"))
+    return genai.GenerativeModel('gemini-1.5-flash')
+
+def _request_fitness_json(image_bytes):
+    """Ask Gemini for the fitness data in a single image and return the response text"""
+    response = _generate_content(get_gemini_model(), [FITNESS_PROMPT, image_bytes])
+    return response.text
+
+def _copy_exception(e):
+    """Copy an exception so it can be raised in several threads, falling back to the original"""
     try:
-        # Convert PIL image to bytes for Gemini API
-        img_byte_arr = io.BytesIO()
+        return copy.copy(e)
+    except Exception:
+        return e
+
+class GeminiBatcher:
+    """
+    Collects images submitted by concurrent requests and sends them to Gemini
+    together, so the prompt and per-request overhead are paid once per batch.
+    """
+    
+    def __init__(self, window=GEMINI_BATCH_WINDOW, max_batch_size=GEMINI_MAX_BATCH_SIZE):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._collector = None
+        self._executor = None
+    
+    def submit(self, image_bytes):
+        """
+        Queue an image and wait for Gemini's answer about it.
         
-        # Ensure image has a format, default to JPEG if not specified
-        img_format = image.format if image.format else 'JPEG'
+        Args:
+            image_bytes (bytes): Encoded image data
         
-        # Save with appropriate format and quality
-        image.save(img_byte_arr, format=img_format, quality=95)
-        img_byte_arr = img_byte_arr.getvalue()
+        Returns:
+            str: Gemini response text for this image, or None if the batched
+                request failed or could not be split and the image should be sent alone
+        """
+        self._ensure_started()
+        future = Future()
+        self._queue.put((image_bytes, future))
+        return future.result()
+    
+    def _ensure_started(self):
+        # Started lazily so worker processes forked after import get their own threads
+        with self._lock:
+            if self._collector is None or not self._collector.is_alive():
+                self._executor = ThreadPoolExecutor(
+                    max_workers=GEMINI_MAX_CONCURRENCY, thread_name_prefix="gemini-batch"
+                )
+                self._collector = threading.Thread(
+                    target=self._collect, name="gemini-batcher", daemon=True
+                )
+                self._collector.start()
+    
+    def _collect(self):
+        while True:
+            batch = [self._queue.get()]
+            deadline = time.monotonic() + self.window
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(self._queue.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            self._executor.submit(self._dispatch, batch)
+    
+    def _dispatch(self, batch):
+        if len(batch) == 1:
+            image_bytes, future = batch[0]
+            try:
+                future.set_result(_request_fitness_json(image_bytes))
+            except Exception as e:
+                future.set_exception(e)
+            return
+        
+        logger.info(f"Sending batch of {len(batch)} images to Gemini API...")
+        try:
+            results = self._request_batch([image_bytes for image_bytes, _ in batch])
+        except RETRYABLE_GEMINI_ERRORS as e:
+            # Retries are already used up and the quota or service is the problem, so
+            # sending each image again would only add load; fail every caller instead.
+            # Each gets its own copy so concurrent raises don't share a traceback.
+            for _, future in batch:
+                future.set_exception(_copy_exception(e))
+            return
+        except Exception as e:
+            # Anything else may come from one bad image; send each image on its own
+            # so only that one fails
+            logger.warning(f"Batched Gemini request failed, falling back to single requests: {str(e)}")
+            results = [None] * len(batch)
+        for (_, future), result in zip(batch, results):
+            future.set_result(result)
+    
+    def _request_batch(self, images):
+        """Send several images in one request and split the answer per image"""
+        contents = [FITNESS_PROMPT + BATCH_PROMPT_SUFFIX.format(count=len(images))]
+        for index, image_bytes in enumerate(images, start=1):
+            contents.extend([f"Image {index}:", image_bytes])
         
-        logger.info(f"Image converted to bytes, size: {len(img_byte_arr)} bytes, format: {img_format}")
+        response = _generate_content(get_gemini_model(), contents)
+        
+        try:
+            data = orjson.loads(_find_json_string(response.text).strip())
+        except orjson.JSONDecodeError as e:
+            logger.warning(f"Could not parse batched Gemini response, falling back to single requests: {e}")
+            return [None] * len(images)
+        
+        if not isinstance(data, dict):
+            logger.warning("Batched Gemini response was not keyed by image, falling back to single requests")
+            return [None] * len(images)
+        
+        results = []
+        for index in range(1, len(images) + 1):
+            item = data.get(str(index))
+            results.append(orjson.dumps(item).decode() if isinstance(item, dict) else None)
+        return results
+
+_gemini_batcher = GeminiBatcher()
+
+def extract_fitness_data_from_image(image):
+    """
+    Extract fitness data from an image using Google's Gemini AI with OCR fallback.
+    
+    Args:
+        image (PIL.Image, str or file object): The image containing fitness data,
+            a path to it or an open file
+    
+    Returns:
+        dict: A dictionary of extracted fitness metrics
+    """
+    try:
+        img_byte_arr = prepare_image_bytes(image)
         
         # Debug: Check if image data is valid
         if len(img_byte_arr) < 100:
             logger.error(f"Image data too small, possibly corrupted: {len(img_byte_arr)} bytes")
             return None
         
-        # Set up the Gemini model
-        model = genai.GenerativeModel('gemini-1.5-flash')
-        
-        # Create the prompt for Gemini
-        prompt = """
-        Extract fitness data from this image. Look for numerical values of metrics such as:
-        - Steps
-        - Calories burned
-        - Distance (miles/km)
-        - Active minutes
-        - Heart rate
-        - Sleep duration
-        - Exercise duration
-        
-        Format the response as a JSON object with the metrics as keys and values as numbers.
-        Only include metrics that are clearly visible in the image.
-        Example: {"steps": 8500, "calories": 2100, "distance": 5.2}
-        
-        If you cannot extract any fitness metrics from the image, respond with {"error": "No fitness data found in image"}
-        """
-        
         # Generate content with the image
         logger.info("Sending request to Gemini API...")
-        response = model.generate_content([prompt, img_byte_arr], timeout=30)
-        
-        # Extract the JSON from the response
-        response_text = response.text
+        response_text = _gemini_batcher.submit(img_byte_arr)
+        if response_text is None:
+            # The batched response had nothing usable for this image, ask about it on its own
+            response_text = _request_fitness_json(img_byte_arr)
         logger.info(f"Received response from Gemini API: {response_text[:100]}...")
         
-        # Find JSON in the response (it might be embedded in markdown code blocks)
-        json_match = re.search(r'```json\s*(.*?)\s*```', response_text, re.DOTALL)
-        if json_match:
-            json_str = json_match.group(1)
-            logger.info("Found JSON in code block")
-        else:
-            # Try to find a regular JSON object
-            json_match = re.search(r'({.*})', response_text, re.DOTALL)
-            if json_match:
-                json_str = json_match.group(1)
-                logger.info("Found JSON in plain text")
-            else:
-                logger.warning("Could not find JSON in response, using full response")
-                json_str = response_text
+        json_str = _find_json_string(response_text)
         
         # Clean up the string and parse the JSON
         json_str = json_str.strip()
         logger.info(f"Parsed JSON string: {json_str}")
         
         try:
-            data = json.loads(json_str)
-        except json.JSONDecodeError as e:
+            data = orjson.loads(json_str)
+        except orjson.JSONDecodeError as e:
             logger.error(f"Failed to parse JSON: {e}")
             logger.error(f"Raw JSON string: {json_str}")
             
@@ -0,0 +1,74 @@
+"""
+Analysis pipeline shared by the Flask API (run.py) and the Streamlit app (app.py):
+image -> fitness data -> health analysis -> recommendations.
+"""
+
+import logging
+from functools import lru_cache
+
+import orjson
+
+from image_processor import extract_fitness_data_from_image
+from health_analyzer import analyze_health_metrics
+from recommendations import generate_recommendations
+from cache import get_cached_results, cache_results
+
+logger = logging.getLogger(__name__)
+
+# The analysis steps are pure functions of their input, so reuse results for identical data.
+# Dicts aren't hashable; key the cache on their canonical JSON bytes instead.
+@lru_cache(maxsize=256)
+def _cached_health_analysis(fitness_data_json):
+    return analyze_health_metrics(orjson.loads(fitness_data_json))
+
+@lru_cache(maxsize=256)
+def _cached_recommendations(analysis_results_json):
+    return generate_recommendations(orjson.loads(analysis_results_json))
+
+def run_pipeline(image, cache_key=None, on_step=None):
+    """
+    Extract, analyze and generate recommendations for a fitness tracker image.
+
+    Args:
+        image (PIL.Image, str or file object): The image containing fitness data,
+            a path to it or an open file
+        cache_key (str): Cache key of the image contents; when given, results are
+            reused for repeated uploads of the same image
+        on_step (callable): Called with "extract", "analyze" or "recommend" before
+            each step runs, for progress reporting
+
+    Returns:
+        tuple: (fitness_data, analysis_results, recommendations), or
+            (None, None, None) if no fitness data could be extracted
+    """
+    if cache_key:
+        cached = get_cached_results(cache_key)
+        if cached:
+            return cached
+
+    # Extract fitness data
+    if on_step:
+        on_step("extract")
+    logger.info("Extracting fitness data...")
+    fitness_data = extract_fitness_data_from_image(image)
+
+    if not fitness_data:
+        logger.warning("No fitness data extracted from image")
+        return None, None, None
+
+    # Analyze the data
+    if on_step:
+        on_step("analyze")
+    logger.info("Analyzing fitness data...")
+    analysis_results = _cached_health_analysis(orjson.dumps(fitness_data, option=orjson.OPT_SORT_KEYS))
+
+    # Generate recommendations
+    if on_step:
+        on_step("recommend")
+    logger.info("Generating recommendations...")
+    recommendations = _cached_recommendations(orjson.dumps(analysis_results, option=orjson.OPT_SORT_KEYS))
+
+    if cache_key:
+        cache_results(cache_key, fitness_data, analysis_results, recommendations)
+
+    return fitness_data, analysis_results, recommendations
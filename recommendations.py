@@ -1,35 +1,10 @@
-from health_analyzer import HealthAnalyzer
-
-def generate_recommendations(analysis_results):
-    """
-    Generate personalized health recommendations based on analysis results.
-    
-    Args:
-        analysis_results (dict): Dictionary containing analyzed health metrics
-    
-    Returns:
-        dict: Dictionary with personalized recommendations
-    """
-    analyzer = HealthAnalyzer()
-    recommendations = {
-        "activity": "",
-        "nutrition": "",
-        "wellness": ""
-    }
-    
-    # Get the activity level and fitness score
+def generate_activity_recommendations(analysis_results):
+    """Activity advice and a sample weekly exercise plan for the activity level"""
     activity_level = analysis_results.get("activity_level", "Unknown")
-    calorie_burn = analysis_results.get("calorie_burn", "Unknown")
-    fitness_score = analysis_results.get("fitness_score", 0)
-    overall_fitness = analysis_results.get("overall_fitness", "Unknown")
-    
-    # Get insights
-    insights = analysis_results.get("insights", [])
-    meditation_time = analysis_results.get("meditation_time", 10)
-    
+
     # Activity recommendations based on activity level
     if activity_level == "Sedentary":
-        recommendations["activity"] = """
+        activity = """
 ### Activity Recommendations
 - Start with a goal of 5,000 steps per day
 - Take short 5-10 minute walks throughout the day
@@ -38,7 +13,7 @@ def generate_recommendations(analysis_results):
 - Set a reminder to move for 5 minutes every hour
         """
     elif activity_level == "Low Active":
-        recommendations["activity"] = """
+        activity = """
 ### Activity Recommendations
 - Aim to increase your daily steps to 7,500
 - Add a 20-minute brisk walk to your daily routine
@@ -47,7 +22,7 @@ def generate_recommendations(analysis_results):
 - Take the stairs instead of elevators when possible
         """
     elif activity_level == "Somewhat Active":
-        recommendations["activity"] = """
+        activity = """
 ### Activity Recommendations
 - Push toward the 10,000 steps per day milestone
 - Incorporate 30 minutes of moderate exercise 5 days a week
@@ -56,7 +31,7 @@ def generate_recommendations(analysis_results):
 - Consider weekend hikes or longer recreational activities
         """
     elif activity_level == "Active":
-        recommendations["activity"] = """
+        activity = """
 ### Activity Recommendations
 - Maintain your excellent activity level of 10,000+ steps
 - Add variety to your routine with different exercise modalities
@@ -65,7 +40,7 @@ def generate_recommendations(analysis_results):
 - Try more challenging strength training or HIIT workouts
         """
     elif activity_level == "Very Active":
-        recommendations["activity"] = """
+        activity = """
 ### Activity Recommendations
 - Your activity level is exceptional - focus on quality and recovery
 - Consider periodization in your training to prevent plateaus
@@ -74,7 +49,7 @@ def generate_recommendations(analysis_results):
 - Consider training for a half-marathon or other endurance event
         """
     else:
-        recommendations["activity"] = """
+        activity = """
 ### Activity Recommendations
 - Aim for at least 30 minutes of moderate activity daily
 - Try to accumulate 150 minutes of exercise per week
@@ -83,9 +58,64 @@ def generate_recommendations(analysis_results):
 - Find activities you enjoy to make exercise sustainable
         """
     
+    # Add a weekly exercise plan based on activity level and exercise recommendations
+    if "exercise_recommendations" in analysis_results:
+        ex_recs = analysis_results["exercise_recommendations"]
+        activity += """
+        
+#### Sample Weekly Exercise Plan
+- **Monday**: """ + ex_recs["cardio"][0] + """
+- **Tuesday**: """ + ex_recs["strength"][0] + """
+- **Wednesday**: Active recovery or """ + ex_recs["flexibility"][0] + """
+- **Thursday**: """ + ex_recs["strength"][1] + """
+- **Friday**: """ + ex_recs["cardio"][1] + """
+- **Weekend**: One longer workout and one recovery day
+        """
+    else:
+        # Add a weekly exercise plan based on activity level
+        if activity_level == "Sedentary" or activity_level == "Low Active":
+            activity += """
+            
+#### Sample Weekly Exercise Plan (Beginner)
+- **Monday**: 15-minute walk
+- **Tuesday**: 10 minutes of basic stretching
+- **Wednesday**: 15-minute walk
+- **Thursday**: Rest or gentle yoga
+- **Friday**: 20-minute walk
+- **Weekend**: One 30-minute recreational activity like swimming or cycling
+            """
+        elif activity_level == "Somewhat Active":
+            activity += """
+            
+#### Sample Weekly Exercise Plan (Intermediate)
+- **Monday**: 30-minute brisk walk or jog
+- **Tuesday**: Basic strength training (bodyweight exercises)
+- **Wednesday**: 30-minute cardio of choice
+- **Thursday**: Yoga or flexibility training
+- **Friday**: 30-minute interval training
+- **Weekend**: One longer (45-60 min) recreational activity
+            """
+        elif activity_level == "Active" or activity_level == "Very Active":
+            activity += """
+            
+#### Sample Weekly Exercise Plan (Advanced)
+- **Monday**: 45-minute run or high-intensity cardio
+- **Tuesday**: Strength training focusing on upper body
+- **Wednesday**: 45-minute interval training or cross-training
+- **Thursday**: Strength training focusing on lower body
+- **Friday**: 30-minute recovery cardio and mobility work
+- **Weekend**: One challenging workout (long run, hike, cycling) and one active recovery day
+            """
+    
+    return activity
+
+def generate_nutrition_recommendations(analysis_results):
+    """Nutrition advice and a sample meal plan for the calorie burn level"""
+    calorie_burn = analysis_results.get("calorie_burn", "Unknown")
+
     # Nutrition recommendations based on calorie burn
     if calorie_burn == "Low":
-        recommendations["nutrition"] = """
+        nutrition = """
 ### Nutrition Recommendations
 - Focus on nutrient-dense, lower-calorie foods
 - Ensure adequate protein intake (0.8g per kg of body weight)
@@ -94,7 +124,7 @@ def generate_recommendations(analysis_results):
 - Stay hydrated with at least 8 glasses of water daily
         """
     elif calorie_burn == "Moderate":
-        recommendations["nutrition"] = """
+        nutrition = """
 ### Nutrition Recommendations
 - Balance your macronutrients (protein, carbs, and fats)
 - Eat regular meals to maintain energy throughout the day
@@ -103,7 +133,7 @@ def generate_recommendations(analysis_results):
 - Consider a pre-workout snack for energy during exercise
         """
     elif calorie_burn == "High" or calorie_burn == "Very High":
-        recommendations["nutrition"] = """
+        nutrition = """
 ### Nutrition Recommendations
 - Increase caloric intake to match your high activity level
 - Focus on post-workout nutrition for recovery
@@ -113,7 +143,7 @@ def generate_recommendations(analysis_results):
 - Stay extra hydrated and consider electrolyte replacement
         """
     else:
-        recommendations["nutrition"] = """
+        nutrition = """
 ### Nutrition Recommendations
 - Eat a balanced diet with plenty of whole foods
 - Include protein with each meal for satiety and muscle health
@@ -122,9 +152,58 @@ def generate_recommendations(analysis_results):
 - Stay hydrated and limit sugary beverages
         """
     
+    # Add a sample meal plan based on calorie burn and food recommendations
+    if "food_recommendations" in analysis_results:
+        food_recs = analysis_results["food_recommendations"]
+        nutrition += """
+        
+#### Sample Meal Plan
+- **Breakfast**: """ + food_recs["breakfast"][0] + """
+- **Lunch**: """ + food_recs["lunch"][0] + """
+- **Dinner**: """ + food_recs["dinner"][0] + """
+- **Snacks**: """ + food_recs["snacks"][0]
+    else:
+        # Add a sample meal plan based on calorie burn
+        if calorie_burn == "Low":
+            nutrition += """
+            
+#### Sample Meal Plan (Low Calorie Burn)
+- **Breakfast**: Greek yogurt with berries and a sprinkle of granola
+- **Lunch**: Large salad with lean protein and light dressing
+- **Dinner**: Baked fish with roasted vegetables
+- **Snacks**: Apple slices with a small amount of nut butter
+            """
+        elif calorie_burn == "Moderate":
+            nutrition += """
+            
+#### Sample Meal Plan (Moderate Calorie Burn)
+- **Breakfast**: Oatmeal with fruit, nuts, and a scoop of protein powder
+- **Lunch**: Whole grain wrap with lean protein, veggies, and hummus
+- **Dinner**: Stir-fry with lean meat or tofu, plenty of vegetables, and brown rice
+- **Snacks**: Greek yogurt with honey, handful of nuts and seeds
+            """
+        elif calorie_burn == "High" or calorie_burn == "Very High":
+            nutrition += """
+            
+#### Sample Meal Plan (High Calorie Burn)
+- **Breakfast**: Eggs with whole grain toast, avocado, and fruit
+- **Lunch**: Hearty grain bowl with quinoa, beans, vegetables, and a protein source
+- **Dinner**: Lean protein with sweet potato, vegetables, and healthy fats
+- **Snacks**: Protein smoothie, trail mix, banana with nut butter
+- **Post-workout**: Protein shake with fruit and a source of carbohydrates
+            """
+    
+    return nutrition
+
+def generate_wellness_recommendations(analysis_results):
+    """Wellness advice and health insights for the overall fitness level"""
+    overall_fitness = analysis_results.get("overall_fitness", "Unknown")
+    insights = analysis_results.get("insights", [])
+    meditation_time = analysis_results.get("meditation_time", 10)
+
     # Wellness recommendations based on overall fitness
     if overall_fitness == "Needs Improvement" or overall_fitness == "Fair":
-        recommendations["wellness"] = f"""
+        wellness = f"""
 ### Wellness Recommendations
 - Focus on consistency rather than intensity
 - Celebrate small victories and progress
@@ -134,7 +213,7 @@ def generate_recommendations(analysis_results):
 - Consider working with a fitness professional to create a personalized plan
         """
     elif overall_fitness == "Good":
-        recommendations["wellness"] = f"""
+        wellness = f"""
 ### Wellness Recommendations
 - Add variety to your routine to prevent plateaus
 - Focus on quality sleep and recovery
@@ -143,7 +222,7 @@ def generate_recommendations(analysis_results):
 - Set specific, measurable goals for the next month
         """
     elif overall_fitness == "Very Good" or overall_fitness == "Excellent":
-        recommendations["wellness"] = f"""
+        wellness = f"""
 ### Wellness Recommendations
 - Focus on recovery and preventing overtraining
 - Consider advanced recovery techniques like contrast therapy
@@ -153,7 +232,7 @@ def generate_recommendations(analysis_results):
 - Consider helping others by sharing your fitness journey
         """
     else:
-        recommendations["wellness"] = f"""
+        wellness = f"""
 ### Wellness Recommendations
 - Prioritize 7-9 hours of quality sleep
 - Practice stress management through meditation ({meditation_time} min/day) or deep breathing
@@ -164,96 +243,23 @@ def generate_recommendations(analysis_results):
     
     # Add health insights if available
     if insights:
-        recommendations["wellness"] = recommendations["wellness"] + "\n\n### Health Insights\n" + "\n".join([f"- {insight}" for insight in insights])
+        wellness = wellness + "\n\n### Health Insights\n" + "\n".join([f"- {insight}" for insight in insights])
     
-    # Add a sample meal plan based on calorie burn and food recommendations
-    if "food_recommendations" in analysis_results:
-        food_recs = analysis_results["food_recommendations"]
-        recommendations["nutrition"] += """
-        
-#### Sample Meal Plan
-- **Breakfast**: """ + food_recs["breakfast"][0] + """
-- **Lunch**: """ + food_recs["lunch"][0] + """
-- **Dinner**: """ + food_recs["dinner"][0] + """
-- **Snacks**: """ + food_recs["snacks"][0]
-    else:
-        # Add a sample meal plan based on calorie burn
-        if calorie_burn == "Low":
-            recommendations["nutrition"] += """
-            
-#### Sample Meal Plan (Low Calorie Burn)
-- **Breakfast**: Greek yogurt with berries and a sprinkle of granola
-- **Lunch**: Large salad with lean protein and light dressing
-- **Dinner**: Baked fish with roasted vegetables
-- **Snacks**: Apple slices with a small amount of nut butter
-            """
-        elif calorie_burn == "Moderate":
-            recommendations["nutrition"] += """
-            
-#### Sample Meal Plan (Moderate Calorie Burn)
-- **Breakfast**: Oatmeal with fruit, nuts, and a scoop of protein powder
-- **Lunch**: Whole grain wrap with lean protein, veggies, and hummus
-- **Dinner**: Stir-fry with lean meat or tofu, plenty of vegetables, and brown rice
-- **Snacks**: Greek yogurt with honey, handful of nuts and seeds
-            """
-        elif calorie_burn == "High" or calorie_burn == "Very High":
-            recommendations["nutrition"] += """
-            
-#### Sample Meal Plan (High Calorie Burn)
-- **Breakfast**: Eggs with whole grain toast, avocado, and fruit
-- **Lunch**: Hearty grain bowl with quinoa, beans, vegetables, and a protein source
-- **Dinner**: Lean protein with sweet potato, vegetables, and healthy fats
-- **Snacks**: Protein smoothie, trail mix, banana with nut butter
-- **Post-workout**: Protein shake with fruit and a source of carbohydrates
-            """
+    return wellness
+
+def generate_recommendations(analysis_results):
+    """
+    Generate personalized health recommendations based on analysis results.
     
-    # Add a weekly exercise plan based on activity level and exercise recommendations
-    if "exercise_recommendations" in analysis_results:
-        ex_recs = analysis_results["exercise_recommendations"]
-        recommendations["activity"] += """
-        
-#### Sample Weekly Exercise Plan
-- **Monday**: """ + ex_recs["cardio"][0] + """
-- **Tuesday**: """ + ex_recs["strength"][0] + """
-- **Wednesday**: Active recovery or """ + ex_recs["flexibility"][0] + """
-- **Thursday**: """ + ex_recs["strength"][1] + """
-- **Friday**: """ + ex_recs["cardio"][1] + """
-- **Weekend**: One longer workout and one recovery day
-        """
-    else:
-        # Add a weekly exercise plan based on activity level
-        if activity_level == "Sedentary" or activity_level == "Low Active":
-            recommendations["activity"] += """
-            
-#### Sample Weekly Exercise Plan (Beginner)
-- **Monday**: 15-minute walk
-- **Tuesday**: 10 minutes of basic stretching
-- **Wednesday**: 15-minute walk
-- **Thursday**: Rest or gentle yoga
-- **Friday**: 20-minute walk
-- **Weekend**: One 30-minute recreational activity like swimming or cycling
-            """
-        elif activity_level == "Somewhat Active":
-            recommendations["activity"] += """
-            
-#### Sample Weekly Exercise Plan (Intermediate)
-- **Monday**: 30-minute brisk walk or jog
-- **Tuesday**: Basic strength training (bodyweight exercises)
-- **Wednesday**: 30-minute cardio of choice
-- **Thursday**: Yoga or flexibility training
-- **Friday**: 30-minute interval training
-- **Weekend**: One longer (45-60 min) recreational activity
-            """
-        elif activity_level == "Active" or activity_level == "Very Active":
-            recommendations["activity"] += """
-            
-#### Sample Weekly Exercise Plan (Advanced)
-- **Monday**: 45-minute run or high-intensity cardio
-- **Tuesday**: Strength training focusing on upper body
-- **Wednesday**: 45-minute interval training or cross-training
-- **Thursday**: Strength training focusing on lower body
-- **Friday**: 30-minute recovery cardio and mobility work
-- **Weekend**: One challenging workout (long run, hike, cycling) and one active recovery day
-            """
+    Args:
+        analysis_results (dict): Dictionary containing analyzed health metrics
     
-    return recommendations
+    Returns:
+        dict: Dictionary with personalized recommendations
+    """
+    # Each category depends only on its own fields of analysis_results
+    return {
+        "activity": generate_activity_recommendations(analysis_results),
+        "nutrition": generate_nutrition_recommendations(analysis_results),
+        "wellness": generate_wellness_recommendations(analysis_results)
+    }
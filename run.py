@@ -3,20 +3,21 @@ import os
 import sys
 import traceback
 import logging
-from flask import Flask, request, jsonify, send_from_directory, abort
+from flask import Flask, Response, request, jsonify, send_from_directory, abort
 from flask_cors import CORS
 from dotenv import load_dotenv
-from PIL import Image
 import io
-import json
+import hashlib
+import orjson
 from datetime import datetime
-import sqlite3
+from functools import lru_cache
 from werkzeug.utils import secure_filename
 
 # Import core functionality
-from image_processor import extract_fitness_data_from_image
-from health_analyzer import analyze_health_metrics
-from recommendations import generate_recommendations
+from pipeline import run_pipeline
+from image_processor import read_image_info, is_image_too_small
+from cache import image_hasher
+from database import init_db, get_history_from_db, add_entry_to_db, get_entry_from_db
 
 # Configure logging
 logging.basicConfig(
@@ -43,95 +44,31 @@ if not os.environ.get("GEMINI_API_KEY"):
 app = Flask(__name__, static_folder='frontend/build')
 CORS(app)  # Enable CORS for all routes
 
-# Configure upload folder for temporary image storage
-UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'temp_uploads')
-if not os.path.exists(UPLOAD_FOLDER):
-    os.makedirs(UPLOAD_FOLDER)
-app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # Limit uploads to 16MB
+UPLOAD_CHUNK_SIZE = 64 * 1024
 
-# Initialize database
-def init_db():
-    conn = sqlite3.connect('fitness_analyzer.db')
-    cursor = conn.cursor()
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS history (
-        id INTEGER PRIMARY KEY AUTOINCREMENT,
-        date TEXT NOT NULL,
-        fitness_data TEXT NOT NULL,
-        analysis_results TEXT NOT NULL,
-        recommendations TEXT NOT NULL
-    )
-    ''')
-    conn.commit()
-    conn.close()
-    logger.info("Database initialized")
+def json_response(payload, status=200):
+    """Serialize a response body with orjson, which is much faster than jsonify on large history lists"""
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
 
-# Get history from database
-def get_history_from_db():
-    try:
-        conn = sqlite3.connect('fitness_analyzer.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, date, fitness_data, analysis_results, recommendations FROM history ORDER BY id DESC')
-        rows = cursor.fetchall()
-        history_items = []
-        for row in rows:
-            history_items.append({
-                "id": row[0],
-                "date": row[1],
-                "fitness_data": json.loads(row[2]),
-                "analysis_results": json.loads(row[3]),
-                "recommendations": json.loads(row[4])
-            })
-        conn.close()
-        return history_items
-    except Exception as e:
-        logger.error(f"Error retrieving history: {str(e)}")
-        return []
-
-# Add entry to database
-def add_entry_to_db(entry):
-    try:
-        conn = sqlite3.connect('fitness_analyzer.db')
-        cursor = conn.cursor()
-        cursor.execute(
-            'INSERT INTO history (date, fitness_data, analysis_results, recommendations) VALUES (?, ?, ?, ?)',
-            (
-                entry["date"],
-                json.dumps(entry["fitness_data"]),
-                json.dumps(entry["analysis_results"]),
-                json.dumps(entry["recommendations"])
-            )
-        )
-        entry_id = cursor.lastrowid
-        conn.commit()
-        conn.close()
-        return entry_id
-    except Exception as e:
-        logger.error(f"Error adding entry to database: {str(e)}")
-        return None
-
-# Get entry from database
-def get_entry_from_db(entry_id):
-    try:
-        conn = sqlite3.connect('fitness_analyzer.db')
-        cursor = conn.cursor()
-        cursor.execute('SELECT id, date, fitness_data, analysis_results, recommendations FROM history WHERE id = ?', (entry_id,))
-        row = cursor.fetchone()
-        conn.close()
-        
-        if row:
-            return {
-                "id": row[0],
-                "date": row[1],
-                "fitness_data": json.loads(row[2]),
-                "analysis_results": json.loads(row[3]),
-                "recommendations": json.loads(row[4])
-            }
-        return None
-    except Exception as e:
-        logger.error(f"Error retrieving entry from database: {str(e)}")
-        return None
+def hash_upload(stream):
+    """
+    Hash an uploaded file in bounded chunks, leaving the stream rewound.
+    
+    Args:
+        stream (file object): The uploaded file's stream
+    
+    Returns:
+        str: Cache key for the uploaded image contents
+    """
+    hasher = image_hasher()
+    while True:
+        chunk = stream.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        hasher.update(chunk)
+    stream.seek(0)
+    return hasher.hexdigest()
 
 @app.route('/api/analyze', methods=['POST'])
 def analyze_image():
@@ -153,50 +90,36 @@ def analyze_image():
             logger.warning(f"Unsupported file format: {filename}")
             return jsonify({'error': 'Unsupported file format. Please use JPG or PNG images'}), 400
             
-        # Save file temporarily
-        temp_path = os.path.join(app.config['UPLOAD_FOLDER'], filename)
-        file.save(temp_path)
-        logger.info(f"Image saved temporarily as {temp_path}")
+        # Werkzeug already buffers the upload (in memory, spilling to disk if large),
+        # so work from its stream rather than writing another copy to disk
+        stream = file.stream
         
-        # Open and process the image
+        # Check the image from its header alone, before any hashing or decoding
         try:
-            image = Image.open(temp_path)
+            image_size, _ = read_image_info(stream)
             
             # Check image dimensions
-            if max(image.size) < 200:
-                logger.warning(f"Image too small: {image.size}")
+            if is_image_too_small(image_size):
+                logger.warning(f"Image too small: {image_size}")
                 return jsonify({'error': 'Image is too small. Please upload a larger image with clear text.'}), 400
             
-            logger.info(f"Processing image of size {image.size}")
+            logger.info(f"Processing image of size {image_size}")
         except Exception as e:
             logger.error(f"Error opening image: {str(e)}")
             return jsonify({'error': f'Invalid image file: {str(e)}'}), 400
         
-        # Extract fitness data
-        logger.info("Extracting fitness data...")
-        fitness_data = extract_fitness_data_from_image(image)
+        # Hash it so repeated submissions can skip the Gemini call
+        stream.seek(0)
+        cache_key = hash_upload(stream)
         
-        # Clean up temporary file
-        try:
-            os.remove(temp_path)
-            logger.info(f"Removed temporary file {temp_path}")
-        except Exception as e:
-            logger.warning(f"Failed to remove temporary file: {str(e)}")
+        # Extract, analyze and generate recommendations
+        fitness_data, analysis_results, recommendations = run_pipeline(stream, cache_key=cache_key)
         
         if not fitness_data:
-            logger.warning("No fitness data extracted from image")
             return jsonify({
                 'error': 'Could not extract fitness data from the image. Please try a clearer image showing fitness metrics.'
             }), 400
         
-        # Analyze the data
-        logger.info("Analyzing fitness data...")
-        analysis_results = analyze_health_metrics(fitness_data)
-        
-        # Generate recommendations
-        logger.info("Generating recommendations...")
-        recommendations = generate_recommendations(analysis_results)
-        
         # Create entry
         entry = {
             "date": datetime.now().isoformat(),
@@ -216,12 +139,12 @@ def analyze_image():
         
         # Return the results
         logger.info(f"Analysis completed successfully for entry {entry_id}")
-        return jsonify({
+        return json_response({
             'fitness_data': fitness_data,
             'analysis_results': analysis_results,
             'recommendations': recommendations,
             'id': entry_id
-        }), 200
+        })
         
     except Exception as e:
         logger.error(f"Error in image analysis: {str(e)}")
@@ -233,7 +156,7 @@ def get_history():
     """API endpoint to retrieve analysis history"""
     logger.info("Retrieving analysis history")
     history = get_history_from_db()
-    return jsonify(history), 200
+    return json_response(history)
 
 @app.route('/api/history/<int:entry_id>', methods=['GET'])
 def get_history_entry(entry_id):
@@ -241,7 +164,7 @@ def get_history_entry(entry_id):
     logger.info(f"Retrieving history entry {entry_id}")
     entry = get_entry_from_db(entry_id)
     if entry:
-        return jsonify(entry), 200
+        return json_response(entry)
     logger.warning(f"Entry not found: {entry_id}")
     return jsonify({'error': 'Entry not found'}), 404
 
@@ -271,15 +194,51 @@ def get_metrics_summary():
             if "distance" in fitness_data:
                 distance_data.append({"date": entry["date"], "value": fitness_data["distance"]})
         
-        return jsonify({
+        return json_response({
             "steps": steps_data,
             "calories": calories_data,
             "distance": distance_data
-        }), 200
+        })
     except Exception as e:
         logger.error(f"Error generating metrics summary: {str(e)}")
         return jsonify({'error': 'Failed to generate metrics summary'}), 500
 
+# React build assets under static/ have content hashes in their names, so they never change
+STATIC_ASSET_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+@lru_cache(maxsize=1)
+def load_index(mtime):
+    """
+    Read the React build's index.html and keep it in memory with its ETag.
+
+    Args:
+        mtime (float): Modification time of index.html; a rebuild changes it,
+            so the new file is read instead of the cached copy
+
+    Returns:
+        tuple: (index_bytes, etag)
+    """
+    with open(os.path.join(app.static_folder, 'index.html'), 'rb') as f:
+        index_bytes = f.read()
+    return index_bytes, hashlib.md5(index_bytes).hexdigest()
+
+def _current_index():
+    """Return (index_bytes, etag) for the current index.html, raising FileNotFoundError if there is none"""
+    return load_index(os.stat(os.path.join(app.static_folder, 'index.html')).st_mtime)
+
+def index_response():
+    """Serve index.html from memory, answering 304 when the client already has it"""
+    try:
+        index_bytes, etag = _current_index()
+    except FileNotFoundError:
+        abort(404)
+    
+    response = Response(index_bytes, mimetype='text/html')
+    response.set_etag(etag)
+    # Clients must revalidate so a new build is picked up right away
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
 # Serve static files from React build
 @app.route('/', defaults={'path': ''})
 @app.route('/<path:path>')
@@ -291,10 +250,13 @@ def serve(path):
         
     # If the path exists as a file in the static folder, serve it
     if path != "" and os.path.exists(os.path.join(app.static_folder, path)):
-        return send_from_directory(app.static_folder, path)
+        response = send_from_directory(app.static_folder, path)
+        if path.startswith('static/'):
+            response.headers['Cache-Control'] = STATIC_ASSET_CACHE_CONTROL
+        return response
     
     # Otherwise, serve index.html to let React Router handle the route
-    return send_from_directory(app.static_folder, 'index.html')
+    return index_response()
 
 # Error handlers
 @app.errorhandler(404)
@@ -302,7 +264,11 @@ def not_found(e):
     logger.warning(f"404 error: {request.path}")
     if request.path.startswith('/api/'):
         return jsonify({"error": "API endpoint not found"}), 404
-    return send_from_directory(app.static_folder, 'index.html')
+    try:
+        index_bytes, _ = _current_index()
+    except FileNotFoundError:
+        return jsonify({"error": "Not Found"}), 404
+    return Response(index_bytes, mimetype='text/html')
 
 @app.errorhandler(500)
 def server_error(e):